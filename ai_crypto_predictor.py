@@ -0,0 +1,154 @@
+# Streamlit dashboard for the Cryptonyk backend (login via email OTP, predictions, alerts)
+
+import os
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter, Retry
+
+def _backend_url() -> str:
+    # Env var first; st.secrets is only consulted as a fallback because
+    # merely reading it raises FileNotFoundError when no secrets.toml exists.
+    url = os.getenv("BACKEND_URL")
+    if url:
+        return url
+    try:
+        return st.secrets["BACKEND_URL"]
+    except (FileNotFoundError, KeyError):
+        return "http://localhost:8000"
+
+
+API_URL = _backend_url()
+BRAND_NAME = os.getenv("BRAND_NAME", "Cryptonyk")
+WINDOWS = ["15m", "1h", "12h", "24h"]
+
+st.set_page_config(page_title=f"{BRAND_NAME} — AI Crypto Predictor", page_icon="📈", layout="wide")
+
+# One keep-alive session for every backend call: login, OTP verify and the
+# dashboard fetches reuse the same TCP/TLS connection instead of paying a
+# fresh handshake each time.
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=10,
+                                     max_retries=Retry(total=2, backoff_factor=0.2)))
+SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=10,
+                                      max_retries=Retry(total=2, backoff_factor=0.2)))
+
+BASE_CSS = """
+.block-container { padding-top: 2rem; }
+div[data-testid="stMetricValue"] { font-size: 1.6rem; }
+.coin-up { color: #16c784; }
+.coin-down { color: #ea3943; }
+"""
+
+LIGHT_CSS = """
+body, .stApp { background-color: #fafafa; color: #111; }
+"""
+
+
+# The script reruns per interaction; cache the concatenated block per theme so
+# each rerun injects one prebuilt string instead of rebuilding two CSS blocks.
+@st.cache_resource
+def css_for(theme: str) -> str:
+    return "<style>" + BASE_CSS + (LIGHT_CSS if theme == "☀️ Light" else "") + "</style>"
+
+
+# Streamlit reruns the whole script on every widget interaction; without the
+# TTL cache each click would hit /predict again. 10s matches the backend cache.
+@st.cache_data(ttl=10)
+def fetch_predictions(email: str, window: str) -> dict:
+    r = SESSION.get(f"{API_URL}/predict", params={"email": email, "window": window}, timeout=10)
+    r.raise_for_status()
+    return r.json()
+
+
+def login():
+    st.title(f"🔐 {BRAND_NAME} Login")
+    email = st.text_input("Email", key="login_email").strip().lower()
+
+    col_send, col_verify = st.columns(2)
+    with col_send:
+        if st.button("Send OTP", disabled=not email):
+            resp = SESSION.post(f"{API_URL}/send-otp", json={"email": email}, timeout=20).json()
+            if resp.get("success"):
+                st.success("OTP sent — check your inbox.")
+            else:
+                st.error(resp.get("message", "Could not send OTP."))
+
+    otp = st.text_input("6-digit OTP", max_chars=6, key="login_otp").strip()
+    with col_verify:
+        if st.button("Verify", disabled=not (email and otp)):
+            resp = SESSION.post(f"{API_URL}/verify-otp", json={"email": email, "otp": otp}, timeout=20).json()
+            if resp.get("authenticated"):
+                st.session_state["email"] = email
+                st.rerun()
+            else:
+                st.error(resp.get("message", "Verification failed."))
+
+
+def render_alerts(email: str):
+    st.subheader("🔔 Alerts")
+    rows = SESSION.get(f"{API_URL}/alerts", params={"email": email}, timeout=10).json().get("alerts", [])
+    for a in rows:
+        c1, c2 = st.columns([4, 1])
+        c1.write(f"{a['symbol']} {a['direction']} {a['percent']}%")
+        if c2.button("Delete", key=f"del-{a['symbol']}-{a['direction']}-{a['percent']}"):
+            SESSION.delete(f"{API_URL}/alerts", params={"email": email, **a}, timeout=10)
+            st.rerun()
+
+    with st.form("new_alert"):
+        c1, c2, c3 = st.columns(3)
+        symbol = c1.selectbox("Symbol", ["BTC", "ETH", "SOL", "ADA", "XRP", "BNB", "DOGE", "AVAX", "MATIC", "LTC"])
+        direction = c2.selectbox("Direction", ["UP", "DOWN"])
+        percent = c3.number_input("Move %", min_value=0.1, max_value=50.0, value=5.0, step=0.1)
+        if st.form_submit_button("Add alert"):
+            SESSION.post(f"{API_URL}/alerts", timeout=10,
+                          json={"email": email, "symbol": symbol, "direction": direction, "percent": percent})
+            st.rerun()
+
+
+def dashboard():
+    email = st.session_state["email"]
+    st.title(f"📈 {BRAND_NAME} Dashboard")
+    st.caption(f"Signed in as {email}")
+
+    window = st.radio("Window", WINDOWS, index=3, horizontal=True)
+    try:
+        payload = fetch_predictions(email, window)
+    except requests.RequestException as e:
+        st.error(f"Backend unreachable: {e}")
+        return
+
+    if payload.get("stale"):
+        st.warning("Prices are stale — upstream data source is throttling.")
+
+    cols = st.columns(5)
+    for i, coin in enumerate(payload.get("coins", [])):
+        arrow = "▲" if coin["prediction"] == "UP" else "▼"
+        with cols[i % 5]:
+            st.metric(
+                label=f"{coin['symbol']} {arrow}",
+                value=f"${coin['price']:,.2f}",
+                delta=f"{coin['change']:+.2f}% ({window})",
+            )
+            st.caption(f"Confidence: {coin['confidence']:.1f}%")
+
+    st.divider()
+    render_alerts(email)
+
+    if st.button("Log out"):
+        del st.session_state["email"]
+        st.rerun()
+
+
+def main():
+    theme = st.sidebar.radio("Theme", ["🌙 Dark", "☀️ Light"])
+    st.markdown(css_for(theme), unsafe_allow_html=True)
+
+    if "email" in st.session_state:
+        dashboard()
+    else:
+        login()
+
+
+if __name__ == "__main__":
+    main()
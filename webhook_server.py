@@ -1,13 +1,27 @@
-from fastapi import FastAPI, Query
+from fastapi import BackgroundTasks, FastAPI, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel, EmailStr
 from dotenv import load_dotenv
+from contextlib import asynccontextmanager
+from functools import lru_cache
 from datetime import datetime, timezone
-from typing import Dict, Any, List, Literal, Optional, Tuple
-from apscheduler.schedulers.background import BackgroundScheduler
-from collections import deque
+from typing import Dict, Any, List, Literal, NamedTuple, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
 from sqlmodel import SQLModel, Field, Session, create_engine, select
-import os, smtplib, ssl, random, requests, time, math
+from sqlalchemy import UniqueConstraint, inspect as sa_inspect
+from sqlalchemy.exc import IntegrityError
+import asyncio
+import httpx
+import numpy as np
+import orjson
+import queue
+import hmac
+import re
+import os, secrets, smtplib, ssl, random, sys, threading, time, zlib
+from email.message import EmailMessage
+from email.utils import formatdate, make_msgid
+from redis import asyncio as aioredis
 
 # ---------- Config ----------
 load_dotenv()
@@ -21,6 +35,8 @@ SMTP_SERVER = os.getenv("SMTP_SERVER")
 SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
 SMTP_USER = os.getenv("SMTP_USER")
 SMTP_PASS = os.getenv("SMTP_PASS")
+# Env vars don't change at runtime; decide once at import instead of per send.
+SMTP_READY: bool = all([SMTP_SERVER, SMTP_PORT, SMTP_USER, SMTP_PASS])
 
 # --- CoinGecko setup (Pro vs Demo/Public) ---
 COINGECKO_API_KEY = os.getenv("COINGECKO_API_KEY")  # optional
@@ -45,6 +61,9 @@ ID_TO_SYMBOL = {
     "binancecoin":"BNB","dogecoin":"DOGE","avalanche-2":"AVAX","matic-network":"MATIC","litecoin":"LTC",
 }
 SYMBOLS = list(ID_TO_SYMBOL.values())
+# Frozen (id, symbol) pairs: the refresh loop iterates this instead of the API
+# response, fixing output order to COIN_IDS and skipping per-coin dict lookups.
+_COIN_ORDER = tuple((cid, ID_TO_SYMBOL[cid]) for cid in COIN_IDS)
 WINDOW_MINUTES = {"15m": 15, "1h": 60, "12h": 720, "24h": 1440}
 
 # ---------- Database ----------
@@ -73,6 +92,12 @@ class User(SQLModel, table=True):
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class Alert(SQLModel, table=True):
+    # The unique constraint doubles as the lookup index: create/delete filter
+    # on exactly these four columns, and the DB enforces idempotency so
+    # concurrent inserts can't race a pre-check into a duplicate row.
+    __table_args__ = (
+        UniqueConstraint("email", "symbol", "direction", "percent", name="uq_alert"),
+    )
     id: Optional[int] = Field(default=None, primary_key=True)
     email: str = Field(foreign_key="user.email", index=True)
     symbol: str
@@ -83,30 +108,187 @@ class Alert(SQLModel, table=True):
 def get_session() -> Session:
     return Session(engine)
 
+def _ensure_alert_unique() -> None:
+    # create_all only creates missing tables, so deployments that predate
+    # uq_alert never pick the constraint up, and without the old pre-check
+    # duplicate rows (and duplicate alert emails) would quietly accumulate.
+    # Back-fill it as a unique index after deduplicating; both statements
+    # run on SQLite and Postgres alike.
+    insp = sa_inspect(engine)
+    existing = {c["name"] for c in insp.get_unique_constraints("alert")}
+    existing |= {i["name"] for i in insp.get_indexes("alert") if i.get("unique")}
+    if "uq_alert" in existing:
+        return
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "DELETE FROM alert WHERE id NOT IN "
+            "(SELECT MIN(id) FROM alert GROUP BY email, symbol, direction, percent)"
+        )
+        conn.exec_driver_sql(
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_alert "
+            "ON alert (email, symbol, direction, percent)"
+        )
+
 # ---------- App ----------
-app = FastAPI(title=APP_NAME, version=APP_VERSION)
+# Concrete origin list (no "*"): Starlette short-circuits to a set membership
+# check and pre-builds the CORS headers, and credentials stay scoped to us.
+ALLOWED_ORIGINS = [
+    FRONTEND_URL,
+    "https://ai-crypto-frontend-8rmwtc8eqtxsasgmhbv8d6.streamlit.app",
+    "https://cryptonyk.com",
+]
+if os.getenv("DEV"):
+    ALLOWED_ORIGINS.append("http://localhost:8501")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Plain asyncio tasks on the server's own loop: no scheduler thread pool,
+    # no per-job locking, and the refresh shares the process-wide HTTP client.
+    SQLModel.metadata.create_all(engine)
+    _ensure_alert_unique()
+    _load_alerts_mirror()
+    await _refresh_prices_once()  # prime cache
+    tasks = [
+        asyncio.create_task(_coarse_ticker()),
+        asyncio.create_task(_refresh_loop()),
+        asyncio.create_task(_alerts_loop()),
+    ]
+    print("🚀 DB ready. Background loops started (60s refresh, 90s alerts).")
+    yield
+    for t in tasks:
+        t.cancel()
+    email_executor.shutdown(wait=False)
+    smtp_pool.close()
+    await http_client.aclose()
+
+app = FastAPI(title=APP_NAME, version=APP_VERSION, default_response_class=ORJSONResponse,
+              lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=[FRONTEND_URL, "https://ai-crypto-frontend-8rmwtc8eqtxsasgmhbv8d6.streamlit.app", "https://cryptonyk.com", "*"],
+    allow_origins=ALLOWED_ORIGINS,
     allow_credentials=True,
     allow_methods=["GET","POST","DELETE","OPTIONS"],
-    allow_headers=["*"],
+    allow_headers=["content-type"],
+)
+
+# ---------- Cross-worker state (optional Redis) ----------
+# With REDIS_URL set, OTPs, OTP rate limits and the latest prices snapshot
+# live in Redis so `uvicorn --workers N` / multiple replicas agree on them.
+# Without it everything falls back to the per-process dicts below.
+REDIS_URL = os.getenv("REDIS_URL")
+redis_client: Optional[aioredis.Redis] = (
+    aioredis.from_url(REDIS_URL, decode_responses=True) if REDIS_URL else None
 )
 
+OTP_TTL_SECONDS = 600
+OTP_RESEND_SECONDS = 60
+# One C-level match call replaces the len()+isdigit() pair per verify attempt.
+# \A..\Z (not ^..$) so a trailing newline can't pass.
+_OTP_MATCH = re.compile(r"\A\d{6}\Z").match
+
+class TTLDict:
+    """Expiring dict with a lock around each read-modify-write.
+
+    The request handlers, the scheduler and the email executor all touch the
+    OTP state; the lock makes get-then-set sequences (e.g. the resend rate
+    limit) atomic, and per-entry TTLs expire entries lazily so the maps stay
+    bounded over weeks of uptime. maxsize is a hard backstop on top of the
+    TTLs: if a burst outruns expiry, the oldest entries are evicted first
+    (insertion order tracks expiry order because the TTL is uniform).
+    """
+    _SWEEP_EVERY = 256
+
+    def __init__(self, ttl: float, maxsize: int = 50_000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._data: Dict[str, Tuple[float, Any]] = {}
+        self._writes = 0
+
+    def set(self, key: str, value: Any) -> None:
+        now = time.time()
+        with self._lock:
+            self._data[key] = (now + self.ttl, value)
+            self._maybe_sweep(now)
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expiry, value = item
+            if expiry <= now:
+                del self._data[key]
+                return None
+            return value
+
+    def pop(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def add_if_absent(self, key: str, value: Any) -> bool:
+        """Atomically insert unless a live entry exists. True if inserted."""
+        now = time.time()
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[0] > now:
+                return False
+            self._data[key] = (now + self.ttl, value)
+            self._maybe_sweep(now)
+            return True
+
+    def _maybe_sweep(self, now: float) -> None:
+        self._writes += 1
+        if self._writes % self._SWEEP_EVERY == 0:
+            expired = [k for k, (expiry, _) in self._data.items() if expiry <= now]
+            for k in expired:
+                del self._data[k]
+        while len(self._data) > self.maxsize:
+            del self._data[next(iter(self._data))]
+
 # ---------- In-memory runtime ----------
-otp_store: Dict[str, str] = {}
-last_otp_sent_at: Dict[str, float] = {}
+otp_store = TTLDict(ttl=OTP_TTL_SECONDS)
+otp_resend_gate = TTLDict(ttl=OTP_RESEND_SECONDS)
 prices_cache: Dict[str, Any] = {"ts": 0.0, "data": [], "stale": True, "error": None}
-last_prices: Dict[str, float] = {}
-last_triggered_at: Dict[str, float] = {}
-price_history: Dict[str, deque[Tuple[float, float]]] = {sym: deque(maxlen=1440) for sym in SYMBOLS}
+# Keyed by (email, symbol id, direction id, percent): a tuple of already-live
+# objects hashes without the per-check f-string allocation the old keys paid.
+last_triggered_at: Dict[Tuple[str, int, int, float], float] = {}
+_DIR_ID = {"UP": 0, "DOWN": 1}
+_ALERT_COOLDOWN_SECONDS = 30 * 60
+# Price history as two preallocated (symbols × samples) float64 matrices plus
+# a per-symbol length. ~230KB of contiguous memory replaces ~14k boxed tuples,
+# rows stay time-sorted for searchsorted lookups, and having all symbols in
+# one matrix leaves the door open to vectorizing window queries across rows.
+HISTORY_MAX = 1440
+N_SYM = len(SYMBOLS)
+SYMBOL_IDX = {sym: i for i, sym in enumerate(SYMBOLS)}
+HIST_TS = np.zeros((N_SYM, HISTORY_MAX), dtype=np.float64)
+HIST_PX = np.zeros((N_SYM, HISTORY_MAX), dtype=np.float64)
+HIST_LEN = np.zeros(N_SYM, dtype=np.int32)
+# Baseline prices for the alert tick's "move since last look" comparison,
+# kept as a vector (indexed by SYMBOL_IDX) so the tick diffs them in one
+# numpy expression rather than a dict get per symbol.
+last_px = np.zeros(N_SYM)
+last_px_set = np.zeros(N_SYM, dtype=bool)
 cg_next_allowed_at: float = 0.0  # rate limit backoff
 
+# Pooled async HTTP client for CoinGecko (connection reuse + HTTP/2),
+# plus a single-flight lock so concurrent cache misses share one upstream call.
+http_client = httpx.AsyncClient(
+    http2=True, timeout=15.0, limits=httpx.Limits(max_connections=20)
+)
+refresh_lock = asyncio.Lock()
+
 # ---------- Models ----------
+# str_strip_whitespace/str_to_lower run in pydantic's Rust core, replacing
+# the manual .strip().lower() the handlers used to do per request.
 class EmailRequest(BaseModel):
+    model_config = {"str_strip_whitespace": True, "str_to_lower": True}
     email: EmailStr
 
 class OTPVerifyRequest(BaseModel):
+    model_config = {"str_strip_whitespace": True, "str_to_lower": True}
     email: EmailStr
     otp: str
 
@@ -117,116 +299,601 @@ class AlertCreate(BaseModel):
     percent: float
 
 # ---------- Helpers ----------
+@lru_cache(maxsize=4096)
+def _norm_email(email: str) -> str:
+    # The same handful of signed-in addresses hits /predict and /alerts
+    # every few seconds; memoizing hands back one shared normalized string
+    # instead of allocating strip+lower copies per request.
+    return email.strip().lower()
+
+_coarse_now: float = time.time()
+
+def coarse_now() -> float:
+    # Wall clock cached by the 250ms ticker task — plenty for cooldown and
+    # TTL checks, and one attribute load instead of a clock syscall.
+    return _coarse_now
+
+async def _coarse_ticker():
+    global _coarse_now
+    while True:
+        _coarse_now = time.time()
+        await asyncio.sleep(0.25)
+
+_iso_cache: List[Any] = [0, ""]
+
 def utcnow_iso() -> str:
-    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+    # Responses only need second resolution, so format once per second and
+    # hand every request within that second the same string. Reads the
+    # ticker-maintained clock, so the common path is two loads and a compare.
+    s = int(coarse_now())
+    if s != _iso_cache[0]:
+        _iso_cache[0] = s
+        _iso_cache[1] = datetime.fromtimestamp(s, timezone.utc).isoformat().replace("+00:00", "Z")
+    return _iso_cache[1]
+
+class SmtpPool:
+    """Small pool of authenticated SMTP connections, reused across sends.
+
+    Connect + STARTTLS + LOGIN costs several round-trips; paying it once per
+    pool slot instead of once per email keeps OTP/alert sends to ~1 RTT.
+    Slots start empty and connect lazily; a failed connection is dropped and
+    its slot re-connects on next use.
+    """
+    def __init__(self, size: int = 2):
+        self._slots: "queue.Queue[Optional[smtplib.SMTP]]" = queue.Queue(maxsize=size)
+        for _ in range(size):
+            self._slots.put(None)
+
+    def _connect(self) -> smtplib.SMTP:
+        context = ssl.create_default_context()
+        conn = smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=20)
+        conn.starttls(context=context)
+        conn.login(SMTP_USER, SMTP_PASS)
+        return conn
+
+    def acquire(self) -> smtplib.SMTP:
+        conn = self._slots.get()
+        if conn is not None:
+            try:
+                # Health check: servers drop idle connections silently, and a
+                # cheap NOOP here beats failing mid-send and retrying.
+                conn.noop()
+                return conn
+            except Exception:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+        return self._connect()
 
-def smtp_ready() -> bool:
-    return all([SMTP_SERVER, SMTP_PORT, SMTP_USER, SMTP_PASS])
+    def release(self, conn: Optional[smtplib.SMTP]) -> None:
+        # On send failure callers release None so the slot reconnects next use.
+        self._slots.put(conn)
+
+    def close(self) -> None:
+        while True:
+            try:
+                conn = self._slots.get_nowait()
+            except queue.Empty:
+                break
+            if conn is not None:
+                try:
+                    conn.quit()
+                except Exception:
+                    pass
+
+smtp_pool = SmtpPool()
+# Alert emails fan out through this executor (bounded by the SMTP pool size)
+# so one scheduler tick pays max(send latency), not the sum.
+email_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="email")
 
 def send_email(to_email: str, subject: str, body: str) -> Dict[str, Any]:
-    if not smtp_ready():
+    if not SMTP_READY:
         return {"success": False, "message": "SMTP configuration incomplete"}
-    # Include From/To headers to look better in inbox
-    msg = f"Subject: {subject}\nFrom: {BRAND_NAME} <{SMTP_USER}>\nTo: {to_email}\n\n{body}"
+    # Proper MIME message (Date/Message-ID/charset) — some receivers bounce or
+    # spam-folder bare header blobs, and send_message reuses the open
+    # connection without re-encoding the payload.
+    msg = EmailMessage()
+    msg["From"] = f"{BRAND_NAME} <{SMTP_USER}>"
+    msg["To"] = to_email
+    msg["Subject"] = subject
+    msg["Date"] = formatdate()
+    msg["Message-ID"] = make_msgid()
+    msg.set_content(body)
+    conn: Optional[smtplib.SMTP] = None
     try:
-        context = ssl.create_default_context()
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=20) as server:
-            server.starttls(context=context)
-            server.login(SMTP_USER, SMTP_PASS)
-            server.sendmail(SMTP_USER, to_email, msg)
+        conn = smtp_pool.acquire()
+        try:
+            conn.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            # Stale keep-alive connection; retry once on a fresh one.
+            conn = smtp_pool._connect()
+            conn.send_message(msg)
         print(f"✅ Email sent to {to_email}")
         return {"success": True}
     except Exception as e:
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+            conn = None
         print("Email send error:", e)
         return {"success": False, "message": str(e)}
+    finally:
+        smtp_pool.release(conn)
+
+def _norm_percent(p: float) -> float:
+    # Thresholds are quantized to 0.01% at every boundary (insert, delete,
+    # mirror keys) so the same user-supplied value always compares equal,
+    # however it was formatted on the wire.
+    return round(float(p), 2)
 
 def percent_move(old: float, new: float) -> float:
     if old <= 0: return 0.0
     return (new - old) / old * 100.0
 
-def _simple_price_call(use_pro: bool) -> requests.Response:
-    ids = ",".join(COIN_IDS)
-    url = f"{cg_base(use_pro)}/simple/price"
-    params = {"ids": ids, "vs_currencies": "usd", "include_24hr_change": "true"}
+# ----- OTP state (Redis when configured, process-local dicts otherwise) -----
+async def otp_rate_limited(email: str) -> bool:
+    if redis_client:
+        allowed = await redis_client.set(f"otprl:{email}", "1", nx=True, ex=OTP_RESEND_SECONDS)
+        return not allowed
+    return not otp_resend_gate.add_if_absent(email, True)
+
+async def store_otp(email: str, otp: str) -> None:
+    if redis_client:
+        await redis_client.set(f"otp:{email}", otp, ex=OTP_TTL_SECONDS)
+    else:
+        otp_store.set(email, otp)
+
+async def fetch_otp(email: str) -> Optional[str]:
+    if redis_client:
+        return await redis_client.get(f"otp:{email}")
+    return otp_store.get(email)
+
+async def clear_otp(email: str) -> None:
+    if redis_client:
+        await redis_client.delete(f"otp:{email}")
+    else:
+        otp_store.pop(email)
+
+# ----- Shared prices snapshot (lets workers reuse one CoinGecko refresh) -----
+async def publish_prices_snapshot() -> None:
+    if not redis_client:
+        return
+    try:
+        blob = orjson.dumps({"ts": prices_cache["ts"], "data": prices_cache["data"]})
+        await redis_client.set("prices:v1", blob, ex=120)
+    except Exception as e:
+        print("snapshot publish error:", e)
+
+async def load_prices_snapshot() -> bool:
+    if not redis_client:
+        return False
+    try:
+        blob = await redis_client.get("prices:v1")
+        if not blob:
+            return False
+        snap = orjson.loads(blob)
+        if snap["ts"] > prices_cache["ts"]:
+            prices_cache.update({"ts": snap["ts"], "data": snap["data"], "stale": False, "error": None})
+            return True
+    except Exception as e:
+        print("snapshot load error:", e)
+    return False
+
+# Shard the id list so one throttled/failed upstream call only stalls its
+# half of the coins, and a cold fetch costs max(shard RTT), not the sum.
+CG_SHARD_SIZE = 5
+_COIN_SHARDS = [COIN_IDS[i:i + CG_SHARD_SIZE] for i in range(0, len(COIN_IDS), CG_SHARD_SIZE)]
+
+def _markets_params(ids: List[str]) -> Dict[str, str]:
+    # /coins/markets returns price + change (and room for volume/cap later)
+    # for all ids in one call. The "_" param busts intermediate HTTP caches
+    # so we never get another client's stale copy, bucketed to 15s so our
+    # own retries within a bucket can still share an edge cache entry.
+    return {
+        "vs_currency": "usd",
+        "ids": ",".join(ids),
+        "price_change_percentage": "24h",
+        "_": f"{int(time.time() // 15)}-{random.randint(0, 1 << 16)}",
+    }
+
+# Conditional-request state per shard: validator from the last 200 plus its
+# parsed payload, so a 304 revalidation costs headers only — no body
+# download and no JSON decode on steady-state ticks.
+_shard_etags: Dict[str, str] = {}
+_shard_payloads: Dict[str, List[Dict[str, Any]]] = {}
+
+async def _markets_call(use_pro: bool, ids: List[str]) -> httpx.Response:
+    url = f"{cg_base(use_pro)}/coins/markets"
     headers = cg_headers(use_pro)
-    print(f"[CG] GET {url} ids={ids} use_pro={use_pro}")
-    r = requests.get(url, params=params, headers=headers, timeout=15)
+    etag = _shard_etags.get(",".join(ids))
+    if etag:
+        headers["If-None-Match"] = etag
+    print(f"[CG] GET {url} ids={','.join(ids)} use_pro={use_pro}")
+    r = await http_client.get(url, params=_markets_params(ids), headers=headers)
     if r.status_code >= 400:
         print(f"[CG] {r.status_code} body: {r.text[:500]}")
     return r
 
-def _refresh_prices_once() -> bool:
+class TokenBucket:
+    """Outbound request budget: refills continuously, spends one per call.
+
+    The 429 backoff reacts after CoinGecko has already throttled us; the
+    bucket keeps an unlucky burst (worker restarts, cache expiry under load)
+    from exceeding the budget in the first place.
+    """
+
+    def __init__(self, rate_per_min: float, capacity: float):
+        self.rate = rate_per_min / 60.0
+        self.capacity = capacity
+        self.tokens = capacity
+        self.ts = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.ts) * self.rate)
+            self.ts = now
+            if self.tokens >= 1.0:
+                self.tokens -= 1.0
+                return True
+            return False
+
+    def drain(self) -> None:
+        with self._lock:
+            self.tokens = 0.0
+            self.ts = time.monotonic()
+
+# 25 calls/min stays well inside the keyless plan's 30-50/min; capacity
+# covers one full sharded refresh plus a retry without queueing.
+cg_bucket = TokenBucket(rate_per_min=25.0, capacity=4.0)
+
+# Sigmoid confidence in 0.1% buckets of 24h change, clamped to +/-50%.
+# Quantizing the input can move the rounded output by at most 0.1 point,
+# invisible next to the one-decimal confidence the API reports.
+_CONF_LUT = np.round(100.0 / (1.0 + np.exp(-np.abs(np.arange(-500, 501) / 10.0) / 6.0)), 1)
+
+async def _fetch_shard(ids: List[str]) -> List[Dict[str, Any]]:
     global cg_next_allowed_at
+    if not cg_bucket.take():
+        raise RuntimeError("CoinGecko call budget exhausted")
+    key = ",".join(ids)
+    r = await _markets_call(COINGECKO_USE_PRO, ids)
+    if r.status_code == 304 and key in _shard_payloads:
+        return _shard_payloads[key]
+    if r.status_code == 429:
+        retry_after = int(r.headers.get("Retry-After", "60"))
+        cg_next_allowed_at = time.time() + max(30, retry_after)
+        cg_bucket.drain()
+        print(f"429 Too Many Requests. Backing off for {retry_after}s")
+        raise RuntimeError("CoinGecko rate limited")
+    if r.status_code in (400, 401, 403):
+        print(f"[CG] {r.status_code} — attempting fallback to public API (no key)")
+        if not cg_bucket.take():
+            raise RuntimeError("CoinGecko call budget exhausted")
+        r2 = await http_client.get(f"{cg_base(False)}/coins/markets", params=_markets_params(ids))
+        if r2.status_code == 429:
+            retry_after = int(r2.headers.get("Retry-After", "60"))
+            cg_next_allowed_at = time.time() + max(30, retry_after)
+            cg_bucket.drain()
+            print(f"[CG fallback] 429. Backing off for {retry_after}s")
+            raise RuntimeError("CoinGecko rate limited")
+        r2.raise_for_status()
+        r = r2
+        print("✅ Fallback succeeded.")
+    else:
+        r.raise_for_status()
+    payload = orjson.loads(r.content)
+    etag = r.headers.get("ETag")
+    if etag:
+        _shard_etags[key] = etag
+        _shard_payloads[key] = payload
+    return payload
+
+PRICES_FRESH_TTL = 10    # under this age the cache is served without refreshing
+PRICES_STALE_TTL = 300   # under this age stale data is still served on upstream failure
+
+def prices_fresh() -> bool:
+    return not prices_cache["stale"] and coarse_now() - prices_cache["ts"] < PRICES_FRESH_TTL
+
+def prices_usable() -> bool:
+    return bool(prices_cache["data"]) and coarse_now() - prices_cache["ts"] < PRICES_STALE_TTL
+
+async def _refresh_prices_once() -> bool:
+    global cg_next_allowed_at
+    if prices_fresh():
+        # Someone else refreshed moments ago — skip the lock entirely.
+        return True
     now = time.time()
     if now < cg_next_allowed_at:
-        return False
+        # Backing off after a 429; stale-but-usable data keeps us serving.
+        return prices_usable()
+    async with refresh_lock:
+        # Double-checked: anyone who queued behind an in-flight refresh finds
+        # the cache it was waiting for and skips a second upstream call.
+        if prices_fresh():
+            return True
+        return await _do_refresh()
+
+_last_raw_digest: int = 0  # checksum of the last CoinGecko payload we transformed
+
+async def _do_refresh() -> bool:
+    global _last_raw_digest
     try:
-        r = _simple_price_call(COINGECKO_USE_PRO)
-        if r.status_code == 429:
-            retry_after = int(r.headers.get("Retry-After", "60"))
-            cg_next_allowed_at = time.time() + max(30, retry_after)
-            print(f"429 Too Many Requests. Backing off for {retry_after}s")
-            return False
-        if r.status_code in (400, 401, 403):
-            print(f"[CG] {r.status_code} — attempting fallback to public API (no key)")
-            r2 = requests.get(
-                f"{cg_base(False)}/simple/price",
-                params={"ids": ",".join(COIN_IDS), "vs_currencies": "usd", "include_24hr_change": "true"},
-                timeout=15,
-            )
-            if r2.status_code == 429:
-                retry_after = int(r2.headers.get("Retry-After", "60"))
-                cg_next_allowed_at = time.time() + max(30, retry_after)
-                print(f"[CG fallback] 429. Backing off for {retry_after}s")
-                return False
-            r2.raise_for_status()
-            r = r2
-            print("✅ Fallback succeeded.")
-        else:
-            r.raise_for_status()
-
-        raw = r.json()
-        data = []
-        for cid, payload in raw.items():
-            price = float(payload.get("usd", 0.0))
-            change = float(payload.get("usd_24h_change", 0.0))
-            sym = ID_TO_SYMBOL.get(cid, cid.upper())
-            direction = "UP" if change >= 0 else "DOWN"
-            conf = 1 / (1 + math.exp(-abs(change) / 6))
-            confidence = round(conf * 100, 1)
-            data.append({"symbol": sym, "price": price, "change": change, "prediction": direction, "confidence": confidence})
+        results = await asyncio.gather(
+            *(_fetch_shard(shard) for shard in _COIN_SHARDS), return_exceptions=True
+        )
+        raw: List[Dict[str, Any]] = []
+        shard_errors: List[BaseException] = []
+        for res in results:
+            if isinstance(res, BaseException):
+                shard_errors.append(res)
+            else:
+                raw.extend(res)
+        if not raw:
+            raise shard_errors[0]
+
+        digest = zlib.crc32(orjson.dumps(raw))
+        if digest == _last_raw_digest and prices_cache["data"]:
+            # Upstream payload identical to last refresh — reuse the derived
+            # list and only bump the timestamps / history below.
+            data = prices_cache["data"]
+            ts = time.time()
+            prices_cache.update({"ts": ts, "stale": False, "error": None})
+            for c in data:
+                sym, price = c["symbol"], float(c["price"])
+                _record_price(sym, ts, price)
+                i = SYMBOL_IDX.get(sym)
+                if i is not None:
+                    last_px[i] = price
+                    last_px_set[i] = True
+            _cache_price_vectors(data)
+            _rebuild_predict_blobs()
+            await publish_prices_snapshot()
+            return True
 
+        by_id = {item.get("id"): item for item in raw}
+        rows = [(sym, by_id[cid]) for cid, sym in _COIN_ORDER if cid in by_id]
+        n = len(rows)
+        syms = [sym for sym, _ in rows]
+        prices = np.fromiter((float(item.get("current_price") or 0.0) for _, item in rows),
+                             dtype=np.float64, count=n)
+        changes = np.fromiter((float(item.get("price_change_percentage_24h") or 0.0) for _, item in rows),
+                              dtype=np.float64, count=n)
+        # Table lookup on the quantized change replaces np.exp per refresh.
+        confs = _CONF_LUT[np.clip(np.rint(changes * 10.0).astype(np.intp) + 500, 0, 1000)]
+        directions = np.where(changes >= 0, "UP", "DOWN")
+        data = [
+            {"symbol": sym, "price": price, "change": change,
+             "prediction": direction, "confidence": confidence}
+            for sym, price, change, direction, confidence
+            in zip(syms, prices.tolist(), changes.tolist(), directions.tolist(), confs.tolist())
+        ]
+        if shard_errors and prices_cache["data"]:
+            # A shard failed this round: keep last-known rows for its symbols
+            # so the payload doesn't shrink while that shard backs off.
+            new_by_sym = {c["symbol"]: c for c in data}
+            prev_by_sym = {c["symbol"]: c for c in prices_cache["data"]}
+            data = [
+                new_by_sym.get(sym) or prev_by_sym[sym]
+                for _, sym in _COIN_ORDER
+                if sym in new_by_sym or sym in prev_by_sym
+            ]
+
+        _last_raw_digest = digest
         ts = time.time()
         prices_cache.update({"ts": ts, "data": data, "stale": False, "error": None})
         for c in data:
             sym, price = c["symbol"], float(c["price"])
-            price_history[sym].append((ts, price))
-            last_prices[sym] = price
+            _record_price(sym, ts, price)
+            i = SYMBOL_IDX.get(sym)
+            if i is not None:
+                last_px[i] = price
+                last_px_set[i] = True
+        _cache_price_vectors(data)
+        _rebuild_predict_blobs()
+        await publish_prices_snapshot()
         return True
 
     except Exception as e:
         prices_cache["error"], prices_cache["stale"] = str(e), True
+        if prices_usable():
+            age = time.time() - prices_cache["ts"]
+            print(f"refresh error: {e} — serving stale cache ({age:.0f}s old)")
+            return True
         print("refresh error:", e)
         return False
 
+def _cache_price_vectors(data: List[Dict[str, Any]]) -> None:
+    # Snapshot the payload as a SYMBOL_IDX-indexed vector once per refresh so
+    # the alert tick and blob rebuild read it instead of re-walking the dicts.
+    px = np.zeros(N_SYM)
+    have = np.zeros(N_SYM, dtype=bool)
+    for c in data:
+        i = SYMBOL_IDX.get(c["symbol"])
+        if i is not None:
+            px[i] = float(c["price"])
+            have[i] = True
+    prices_cache["px_vec"] = px
+    prices_cache["have_vec"] = have
+
+def _record_price(sym: str, ts: float, price: float) -> None:
+    i = SYMBOL_IDX.get(sym)
+    if i is None:
+        return
+    n = int(HIST_LEN[i])
+    if n == HISTORY_MAX:
+        # Full row: shift left one slot (one memmove over 11KB, once a minute).
+        HIST_TS[i, :-1] = HIST_TS[i, 1:]
+        HIST_PX[i, :-1] = HIST_PX[i, 1:]
+        n -= 1
+    HIST_TS[i, n] = ts
+    HIST_PX[i, n] = price
+    HIST_LEN[i] = n + 1
+
 def get_window_change(sym: str, minutes: int, current_price: float) -> float:
     if minutes <= 0: return 0.0
+    i = SYMBOL_IDX.get(sym)
+    if i is None:
+        return 0.0
+    n = int(HIST_LEN[i])
+    if n == 0:
+        return 0.0
     cutoff = time.time() - (minutes * 60)
-    hist = price_history.get(sym, deque())
-    base = None
-    for ts, p in hist:
-        if ts >= cutoff:
-            base = p
-            break
-    if base is None:
-        base = hist[0][1] if hist else current_price
+    j = int(np.searchsorted(HIST_TS[i, :n], cutoff))
+    # Same fallback as the old linear scan: if everything predates the
+    # cutoff, measure from the oldest sample we have.
+    base = float(HIST_PX[i, j]) if j < n else float(HIST_PX[i, 0])
     return percent_move(base, current_price)
 
-def scheduled_refresh():
-    _refresh_prices_once()
+_HIST_POS = np.arange(HISTORY_MAX)
+_SYM_ROWS = np.arange(N_SYM)
+
+def get_window_changes(minutes: int, prices: np.ndarray) -> np.ndarray:
+    """get_window_change for every tracked symbol in one pass.
+
+    A masked count over the timestamp matrix finds each row's first sample
+    inside the window (same answer as searchsorted, but batched in C), then
+    the moves come out of one vectorized expression. Symbols with no history
+    or a zero base report 0.0, matching the scalar helper.
+    """
+    if minutes <= 0:
+        return np.zeros(N_SYM)
+    cutoff = time.time() - (minutes * 60)
+    lens = HIST_LEN[:, None]
+    idx = ((HIST_TS < cutoff) & (_HIST_POS < lens)).sum(axis=1)
+    # All-older rows fall back to the oldest sample, like the scalar path.
+    base = HIST_PX[_SYM_ROWS, np.where(idx < HIST_LEN, idx, 0)]
+    safe = np.where(base > 0, base, 1.0)
+    return np.where((HIST_LEN > 0) & (base > 0), (prices - base) / safe * 100.0, 0.0)
+
+# Pre-rendered /predict bodies, one per window, rebuilt after each refresh.
+# Inputs only change when the refresh lands, so a request on the hot path
+# costs a dict lookup plus one bytes splice for the caller's email instead
+# of building and serializing ten dicts.
+_predict_blobs: Dict[str, bytes] = {}
+_predict_blobs_ts: float = 0.0
+
+def _rebuild_predict_blobs() -> None:
+    global _predict_blobs, _predict_blobs_ts
+    coins = prices_cache["data"]
+    if not coins:
+        return
+    ts, stale, err = prices_cache["ts"], prices_cache["stale"], prices_cache["error"]
+    prices_vec = prices_cache.get("px_vec")
+    if prices_vec is None:
+        prices_vec = np.zeros(N_SYM)
+        for c in coins:
+            i = SYMBOL_IDX.get(c["symbol"])
+            if i is not None:
+                prices_vec[i] = float(c["price"])
+    blobs: Dict[str, bytes] = {}
+    for window, minutes in WINDOW_MINUTES.items():
+        changes = get_window_changes(minutes, prices_vec)
+        enriched = []
+        for c in coins:
+            sym, price = c["symbol"], float(c["price"])
+            i = SYMBOL_IDX.get(sym)
+            enriched.append({"symbol": sym, "price": price,
+                             "change": float(changes[i]) if i is not None else 0.0,
+                             "prediction": c["prediction"], "confidence": c["confidence"]})
+        blobs[window] = orjson.dumps({"timestamp": utcnow_iso(), "window": window, "stale": stale,
+                                      "coins": enriched, "backend_ts": ts, "backend_error": err})
+    _predict_blobs = blobs
+    _predict_blobs_ts = ts
+
+async def _refresh_loop():
+    while True:
+        await asyncio.sleep(60)
+        try:
+            await _refresh_prices_once()
+        except Exception as e:
+            print("refresh loop error:", e)
 
-def all_alerts(session: Session) -> List["Alert"]:
-    return session.exec(select(Alert)).all()
+async def _alerts_loop():
+    while True:
+        await asyncio.sleep(90)
+        try:
+            # Sync on purpose: the check is dict work plus an occasional DB
+            # resync, so it runs off-loop like the old scheduler executor did.
+            await asyncio.to_thread(check_alerts_and_notify)
+        except Exception as e:
+            print("alerts loop error:", e)
+
+# In-memory mirror of the Alert table. The scheduler tick reads this instead
+# of opening a session and selecting every row per minute; the alert routes
+# keep it in sync under the lock and the DB stays the durable store. A slow
+# periodic resync picks up rows written by sibling gunicorn workers.
+# Entries carry their cooldown key precomputed, so the hot loop never
+# rebuilds a key for an alert that fires tick after tick.
+class _MirrorAlert(NamedTuple):
+    email: str
+    symbol: str
+    direction: str
+    percent: float
+    key: Tuple[str, int, int, float]
+
+def _mirror_entry(email: str, symbol: str, direction: str, percent: float) -> _MirrorAlert:
+    # Intern the enum-like strings the DB driver allocated fresh per row:
+    # one copy per distinct email/symbol/direction, cheap hashes.
+    email, symbol, direction = sys.intern(email), sys.intern(symbol), sys.intern(direction)
+    key = (email, SYMBOL_IDX.get(symbol, -1), _DIR_ID.get(direction, 0), round(percent, 2))
+    return _MirrorAlert(email, symbol, direction, percent, key)
+
+_alerts_mirror: List[_MirrorAlert] = []
+_alerts_lock = threading.Lock()
+_ALERTS_RESYNC_SECONDS = 900
+_alerts_synced_at = 0.0
+
+# SoA companion to the mirror: symbol index, direction sign (+1 UP / -1 DOWN)
+# and threshold as parallel arrays aligned with _alerts_mirror, so threshold
+# evaluation is one vectorized compare instead of A Python comparisons.
+# Rebuilt under the lock on every mutation; mutations are rare, ticks aren't.
+_alert_sym_idx = np.zeros(0, dtype=np.int32)
+_alert_dir_sign = np.zeros(0, dtype=np.int8)
+_alert_threshold = np.zeros(0, dtype=np.float64)
+
+def _rebuild_alert_table() -> None:
+    # Caller holds _alerts_lock.
+    global _alert_sym_idx, _alert_dir_sign, _alert_threshold
+    n = len(_alerts_mirror)
+    _alert_sym_idx = np.fromiter((SYMBOL_IDX.get(a.symbol, 0) for a in _alerts_mirror), np.int32, n)
+    _alert_dir_sign = np.fromiter((1 if a.direction == "UP" else -1 for a in _alerts_mirror), np.int8, n)
+    _alert_threshold = np.fromiter((a.percent for a in _alerts_mirror), np.float64, n)
+
+def _alerts_table_snapshot() -> Tuple[List[_MirrorAlert], np.ndarray, np.ndarray, np.ndarray]:
+    with _alerts_lock:
+        return list(_alerts_mirror), _alert_sym_idx, _alert_dir_sign, _alert_threshold
+
+def _load_alerts_mirror() -> None:
+    global _alerts_synced_at
+    with get_session() as session:
+        rows = session.exec(select(Alert)).all()
+        entries = [_mirror_entry(a.email, a.symbol, a.direction, a.percent) for a in rows]
+    with _alerts_lock:
+        _alerts_mirror[:] = entries
+        _rebuild_alert_table()
+    _alerts_synced_at = time.time()
+
+def _mirror_add(email: str, symbol: str, direction: str, percent: float) -> None:
+    with _alerts_lock:
+        _alerts_mirror.append(_mirror_entry(email, symbol, direction, percent))
+        _rebuild_alert_table()
+
+def _mirror_remove(email: str, symbol: str, direction: str, percent: float) -> None:
+    with _alerts_lock:
+        _alerts_mirror[:] = [
+            a for a in _alerts_mirror
+            if not (a.email == email and a.symbol == symbol and a.direction == direction and a.percent == percent)
+        ]
+        _rebuild_alert_table()
+
+def _mirror_snapshot() -> List[_MirrorAlert]:
+    with _alerts_lock:
+        return list(_alerts_mirror)
 
 def ensure_user(session: Session, email: str) -> None:
     if not session.get(User, email):
@@ -236,80 +903,144 @@ def ensure_user(session: Session, email: str) -> None:
 def check_alerts_and_notify():
     try:
         if not prices_cache["data"]:
-            _refresh_prices_once()
+            return  # refresh job will prime the cache shortly
         coins = prices_cache["data"]
-        sym_to_price = {c["symbol"]: float(c["price"]) for c in coins}
+        tick_now = time.time()  # one clock read per tick, shared by every alert
+        prices_now = prices_cache.get("px_vec")
+        have_now = prices_cache.get("have_vec")
+        if prices_now is None or have_now is None:
+            prices_now = np.zeros(N_SYM)
+            have_now = np.zeros(N_SYM, dtype=bool)
+            for c in coins:
+                i = SYMBOL_IDX.get(c["symbol"])
+                if i is not None:
+                    prices_now[i] = float(c["price"])
+                    have_now[i] = True
 
-        with get_session() as session:
-            records = all_alerts(session)
-            for a in records:
-                sym = a.symbol
-                if sym not in sym_to_price: continue
-                now_p = sym_to_price[sym]
-                prev_p = last_prices.get(sym, now_p)
-                mv = percent_move(prev_p, now_p)
-                hit = (a.direction == "UP" and mv >= a.percent) or (a.direction == "DOWN" and mv <= -a.percent)
-                if hit:
-                    key = f"{a.email}:{sym}:{a.direction}:{a.percent:.2f}"
-                    last = last_triggered_at.get(key, 0.0)
-                    if time.time() - last >= 30*60:
-                        subject = f"[{BRAND_NAME} Alert] {sym} moved {mv:+.2f}% ({a.direction} {a.percent}%)"
-                        body = (f"Symbol: {sym}\nDirection: {a.direction}\nThreshold: {a.percent}%\n"
-                                f"Move since last minute: {mv:+.2f}%\nCurrent price: ${now_p:,.2f}\n\nTime (UTC): {utcnow_iso()}")
-                        send_email(a.email, subject, body)
-                        last_triggered_at[key] = time.time()
-        for sym, p in sym_to_price.items():
-            last_prices[sym] = p
+        if tick_now - _alerts_synced_at >= _ALERTS_RESYNC_SECONDS:
+            _load_alerts_mirror()
+        records, sym_idx, dir_sign, thresholds = _alerts_table_snapshot()
+        if records:
+            # All thresholds at once: diff the baseline vector, then one
+            # signed compare over the SoA arrays. Python only touches the hits.
+            prices_prev = np.where(last_px_set, last_px, prices_now)
+            # Quiet tick (upstream payload reused): nothing can fire and the
+            # baselines are already current, so skip the whole evaluation.
+            # Only once every symbol has a seeded baseline, else fall through.
+            if bool(last_px_set[have_now].all()) and np.array_equal(prices_now, prices_prev):
+                return
+            moves = np.where(prices_prev > 0, (prices_now - prices_prev) / np.where(prices_prev > 0, prices_prev, 1.0) * 100.0, 0.0)
+            # Symbols absent from this payload (delisted id, short upstream
+            # row set) have prices_now 0, which reads as a -100% move against
+            # a seeded baseline; mask them out like the per-coin loop's
+            # "not in sym_to_price" skip used to.
+            hits = np.nonzero(have_now[sym_idx] & (moves[sym_idx] * dir_sign >= thresholds))[0]
+            for k in hits:
+                a = records[k]
+                key = a.key
+                last = last_triggered_at.get(key, 0.0)
+                if tick_now - last >= _ALERT_COOLDOWN_SECONDS:
+                    sym = a.symbol
+                    mv = float(moves[sym_idx[k]])
+                    now_p = float(prices_now[sym_idx[k]])
+                    subject = f"[{BRAND_NAME} Alert] {sym} moved {mv:+.2f}% ({a.direction} {a.percent}%)"
+                    body = (f"Symbol: {sym}\nDirection: {a.direction}\nThreshold: {a.percent}%\n"
+                            f"Move since last minute: {mv:+.2f}%\nCurrent price: ${now_p:,.2f}\n\nTime (UTC): {utcnow_iso()}")
+                    # Mark triggered before the async send so a slow SMTP
+                    # round-trip can't double-fire on the next tick.
+                    last_triggered_at[key] = tick_now
+                    email_executor.submit(send_email, a.email, subject, body)
+        last_px[have_now] = prices_now[have_now]
+        last_px_set[have_now] = True
+        # Entries past the cooldown can never suppress a send again; dropping
+        # them each tick keeps the map bounded by recently-fired alerts
+        # instead of growing for every alert that ever triggered.
+        expired = [k for k, t in last_triggered_at.items() if tick_now - t >= _ALERT_COOLDOWN_SECONDS]
+        for k in expired:
+            del last_triggered_at[k]
     except Exception as e:
         print("check_alerts_and_notify error:", e)
 
 # ---------- Routes ----------
 @app.get("/")
-def root():
+async def root():
     return {"status": "ok", "app": APP_NAME, "version": APP_VERSION}
 
 @app.get("/version")
-def version():
+async def version():
     return {"version": APP_VERSION, "brand": BRAND_NAME, "build_time": utcnow_iso(),
             "stale": prices_cache["stale"], "last_ts": prices_cache["ts"], "last_error": prices_cache["error"],
             "status": "Backend is running!"}
 
 @app.post("/send-otp")
-def send_otp(req: EmailRequest):
-    email = req.email.strip().lower()
-    now = time.time()
-    if now - last_otp_sent_at.get(email, 0) < 60:
+async def send_otp(req: EmailRequest, background: BackgroundTasks):
+    email = req.email
+    if await otp_rate_limited(email):
         return {"success": False, "message": "Please wait 60s before requesting another OTP."}
-    last_otp_sent_at[email] = now
-    otp = f"{random.randint(100000, 999999)}"
-    otp_store[email] = otp
-    result = send_email(email, f"Your {BRAND_NAME} OTP Code", f"Your login OTP is: {otp}\n\nThis code expires in 10 minutes.")
-    return {"success": True, "message": "OTP sent"} if result.get("success") else {"success": False, "message": result.get("message", "Send failed")}
+    if not SMTP_READY:
+        return {"success": False, "message": "SMTP configuration incomplete"}
+    # secrets, not random: a login code must come from a CSPRNG
+    otp = f"{secrets.randbelow(900000) + 100000}"
+    await store_otp(email, otp)
+    # SMTP is a multi-second handshake; deliver after the response is sent.
+    background.add_task(send_email, email, f"Your {BRAND_NAME} OTP Code",
+                        f"Your login OTP is: {otp}\n\nThis code expires in 10 minutes.")
+    return {"success": True, "message": "OTP sent"}
 
 @app.post("/verify-otp")
-def verify_otp(req: OTPVerifyRequest):
-    email, otp = req.email.strip().lower(), req.otp.strip()
-    if not otp or len(otp) != 6 or not otp.isdigit():
+async def verify_otp(req: OTPVerifyRequest):
+    email, otp = req.email, req.otp
+    if not _OTP_MATCH(otp):
         return {"authenticated": False, "message": "Invalid OTP format"}
-    if otp_store.get(email) == otp:
-        otp_store.pop(email, None)
+    stored = await fetch_otp(email)
+    # compare_digest: constant-time, no early exit on first wrong digit
+    if stored and hmac.compare_digest(stored, otp):
+        await clear_otp(email)
         with get_session() as session:
             ensure_user(session, email)
         return {"authenticated": True, "pro": False}
     return {"authenticated": False, "message": "Incorrect or expired OTP"}
 
 @app.get("/predict")
-def predict(email: str, window: Literal["15m","1h","12h","24h"]="24h"):
-    email = email.strip().lower()
-    if not prices_cache["data"]:
-        _refresh_prices_once()
+async def predict(request: Request, email: str, window: Literal["15m","1h","12h","24h"]="24h"):
+    email = _norm_email(email)
+    if not prices_fresh():
+        if prices_usable():
+            # Stale-while-revalidate: answer from the stale entry now and let
+            # a background task refetch. The single-flight lock already
+            # coalesces these, so only kick one off if nobody holds it.
+            if not refresh_lock.locked():
+                asyncio.create_task(_refresh_prices_once())
+        elif not await load_prices_snapshot():
+            await _refresh_prices_once()
+    if not prices_cache["stale"] and prices_cache["ts"] == _predict_blobs_ts:
+        # Weak validator tied to the cache generation: a poller that already
+        # holds this generation gets a bodyless 304 instead of a re-encode.
+        etag = f'W/"{int(_predict_blobs_ts)}-{window}"'
+        headers = {"ETag": etag, "Cache-Control": f"max-age={PRICES_FRESH_TTL}"}
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+        blob = _predict_blobs.get(window)
+        if blob is not None:
+            # Splice the caller's email onto the shared pre-rendered body.
+            return Response(content=b'{"email":' + orjson.dumps(email) + b"," + blob[1:],
+                            media_type="application/json", headers=headers)
     coins, ts, stale, err = prices_cache["data"], prices_cache["ts"], prices_cache["stale"], prices_cache["error"]
     try:
         minutes = WINDOW_MINUTES.get(window, 1440)
+        # One batched history lookup for the whole payload instead of a
+        # searchsorted call per coin.
+        prices_vec = np.zeros(N_SYM)
+        for c in coins:
+            i = SYMBOL_IDX.get(c["symbol"])
+            if i is not None:
+                prices_vec[i] = float(c["price"])
+        changes = get_window_changes(minutes, prices_vec)
         enriched = []
         for c in coins:
             sym, price = c["symbol"], float(c["price"])
-            win_change = get_window_change(sym, minutes, price)
+            i = SYMBOL_IDX.get(sym)
+            win_change = float(changes[i]) if i is not None else 0.0
             enriched.append({"symbol": sym, "price": price, "change": win_change,
                              "prediction": c["prediction"], "confidence": c["confidence"]})
         return {"email": email, "timestamp": utcnow_iso(), "window": window, "stale": stale,
@@ -321,27 +1052,23 @@ def predict(email: str, window: Literal["15m","1h","12h","24h"]="24h"):
 # ----- Alerts (persisted) -----
 @app.get("/alerts")
 def list_alerts(email: EmailStr):
-    e = email.strip().lower()
+    e = _norm_email(email)
     with get_session() as session:
         rows = session.exec(select(Alert).where(Alert.email == e)).all()
         return {"email": e, "alerts": [{"symbol": r.symbol, "direction": r.direction, "percent": r.percent} for r in rows]}
 
 @app.post("/alerts")
 def create_alert(alert: AlertCreate):
-    e = alert.email.strip().lower()
+    e = _norm_email(alert.email)
     with get_session() as session:
         ensure_user(session, e)
-        existing = session.exec(
-            select(Alert).where(
-                (Alert.email == e) &
-                (Alert.symbol == alert.symbol) &
-                (Alert.direction == alert.direction) &
-                (Alert.percent == float(alert.percent))
-            )
-        ).first()
-        if not existing:
-            session.add(Alert(email=e, symbol=alert.symbol, direction=alert.direction, percent=float(alert.percent)))
+        pct = _norm_percent(alert.percent)
+        session.add(Alert(email=e, symbol=alert.symbol, direction=alert.direction, percent=pct))
+        try:
             session.commit()
+            _mirror_add(e, alert.symbol, alert.direction, pct)
+        except IntegrityError:
+            session.rollback()  # duplicate alert; uq_alert already holds the row
         rows = session.exec(select(Alert).where(Alert.email == e)).all()
         return {"success": True, "alerts": [{"symbol": r.symbol, "direction": r.direction, "percent": r.percent} for r in rows]}
 
@@ -352,58 +1079,34 @@ def create_alert_get(
     direction: Literal["UP","DOWN"] = Query(...),
     percent: float = Query(...)
 ):
-    e = email.strip().lower()
+    e = _norm_email(email)
     with get_session() as session:
         ensure_user(session, e)
-        existing = session.exec(
-            select(Alert).where(
-                (Alert.email == e) &
-                (Alert.symbol == symbol) &
-                (Alert.direction == direction) &
-                (Alert.percent == float(percent))
-            )
-        ).first()
-        if not existing:
-            session.add(Alert(email=e, symbol=symbol, direction=direction, percent=float(percent)))
+        pct = _norm_percent(percent)
+        session.add(Alert(email=e, symbol=symbol, direction=direction, percent=pct))
+        try:
             session.commit()
+            _mirror_add(e, symbol, direction, pct)
+        except IntegrityError:
+            session.rollback()  # duplicate alert; uq_alert already holds the row
         rows = session.exec(select(Alert).where(Alert.email == e)).all()
         return {"success": True, "alerts": [{"symbol": r.symbol, "direction": r.direction, "percent": r.percent} for r in rows]}
 
 @app.delete("/alerts")
 def delete_alert(email: EmailStr, symbol: str, direction: str, percent: float):
-    e = email.strip().lower()
+    e = _norm_email(email)
     with get_session() as session:
         rows = session.exec(
             select(Alert).where(
                 (Alert.email == e) &
                 (Alert.symbol == symbol) &
                 (Alert.direction == direction) &
-                (Alert.percent == float(percent))
+                (Alert.percent == _norm_percent(percent))
             )
         ).all()
         for r in rows:
             session.delete(r)
         session.commit()
+        _mirror_remove(e, symbol, direction, _norm_percent(percent))
         rows = session.exec(select(Alert).where(Alert.email == e)).all()
         return {"success": True, "alerts": [{"symbol": r.symbol, "direction": r.direction, "percent": r.percent} for r in rows]}
-
-# ---------- Lifecycle ----------
-scheduler: Optional[BackgroundScheduler] = None
-
-@app.on_event("startup")
-def on_start():
-    SQLModel.metadata.create_all(engine)
-    global scheduler
-    _refresh_prices_once()  # prime cache
-    scheduler = BackgroundScheduler(daemon=True)
-    scheduler.add_job(scheduled_refresh, "interval", seconds=60, max_instances=1)
-    scheduler.add_job(check_alerts_and_notify, "interval", seconds=90, max_instances=1)
-    scheduler.start()
-    print("🚀 DB ready. Schedulers started (60s refresh, 90s alerts).")
-
-@app.on_event("shutdown")
-def on_stop():
-    global scheduler
-    if scheduler:
-        scheduler.shutdown(wait=False)
-        print("⏹️ Schedulers stopped.")